@@ -1,102 +1,270 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from flask.logging import default_handler
+from flask.json.provider import JSONProvider
+from flask_caching import Cache
 from flask_cors import CORS
-import json
+import ijson
+import orjson
 import requests
-import csv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import atexit
+import hashlib
 import io
-from typing import List, Dict, Any, Optional
-from functools import lru_cache
+import logging
+import os
+import queue
+import re
+import runpy
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, List, Dict, Any, Iterator, Optional, Tuple
+from functools import wraps
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from scipy.spatial import cKDTree
 
 app = Flask(__name__)
 CORS(app)
 
+# Log records are queued and written by a background thread, so request
+# handlers never block on stdout
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+log_listener = QueueListener(log_queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+app.logger.removeHandler(default_handler)
+app.logger.addHandler(QueueHandler(log_queue))
+app.logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+
+# Shared cache for downloaded datasets; set CACHE_TYPE=RedisCache and
+# CACHE_REDIS_URL to share it between worker processes
+cache = Cache(app, config={
+    'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'SimpleCache'),
+    'CACHE_REDIS_URL': os.environ.get('CACHE_REDIS_URL'),
+    'CACHE_DEFAULT_TIMEOUT': 3600
+})
+
 # CKAN API base URL
 CKAN_API_BASE = "https://opendata.muenchen.de/api/3/action"
 
+# Concurrent dataset fetches per search (plus one thread for the metadata lookup)
+MAX_FETCH_WORKERS = 16
+
+# Request threads per gunicorn worker, taken from gunicorn.conf.py
+REQUEST_THREADS = runpy.run_path(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+)['threads']
+
+# Shared session so all CKAN calls reuse pooled TCP/TLS connections. The pool
+# holds one connection per fetch thread of every concurrent request. Only the
+# listed gateway errors are retried; connect and read timeouts fail right away
+# so a hung CKAN does not hold a request for several timeouts. Retry-After is
+# ignored because urllib3 sleeps for whatever a 503 asks, without an upper bound
+SESSION = requests.Session()
+CKAN_ADAPTER = HTTPAdapter(
+    pool_connections=MAX_FETCH_WORKERS,
+    pool_maxsize=(MAX_FETCH_WORKERS + 1) * REQUEST_THREADS,
+    max_retries=Retry(total=3, connect=0, read=0, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                      respect_retry_after_header=False)
+)
+SESSION.mount('https://', CKAN_ADAPTER)
+SESSION.mount('http://', CKAN_ADAPTER)
+
+# Header names recognised as latitude/longitude columns in CSV resources
+LAT_COLUMN_RE = re.compile(r'lat|latitude|breitengrad|y|northing', re.IGNORECASE)
+LON_COLUMN_RE = re.compile(r'lon|lng|longitude|laengengrad|längengrad|x|easting', re.IGNORECASE)
+
+# Number of features serialized per chunk of a streamed search response
+STREAM_BATCH_SIZE = 200
+
+# Munich publishes projected coordinates in ETRS89 / UTM zone 32N
+UTM_TO_WGS84 = Transformer.from_crs("EPSG:25832", "EPSG:4326", always_xy=True)
+
+# Mean Earth radius used for distance calculations
+EARTH_RADIUS_KM = 6371
+
+# Downloaded datasets are cached on disk so restarts do not re-fetch them
+CKAN_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.ckan_cache')
+CKAN_CACHE_TTL = 24 * 60 * 60
+
+# Datasets looked up per package_search call when fetching selection metadata;
+# every id is sent twice (id and name), so 25 names of up to 100 characters keep
+# the request line around 6 KB, below the common 8 KB limit. Looked-up titles are
+# reused for a shorter time than the dataset cache
+METADATA_BATCH_SIZE = 25
+METADATA_CACHE_TIMEOUT = 60
+
+# Aggregated selections (features, search text, titles) are rebuilt after this
+# many seconds so dataset and title updates reach searches
+AGGREGATE_CACHE_TIMEOUT = 5 * 60
+
+# Distinct limits whose unfiltered search body is kept per cached selection
+EMPTY_RESPONSES_PER_SELECTION = 4
+
+# Resource bodies at least this large are stream-parsed instead of loaded at once
+STREAM_PARSE_MIN_BYTES = 20 * 1024 * 1024
+
+# ============================================================================
+# JSON Helpers
+# ============================================================================
+
+# NumPy values are serialized natively; non-string dict keys are stringified as stdlib json did
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider that serializes with orjson, including NumPy values"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        # Emit orjson's bytes directly instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, option=ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype='application/json')
+
+app.json = OrjsonProvider(app)
+
+def conditional_json(payload: Dict[str, Any], max_age: int = 60) -> Response:
+    """JSON response with an ETag, answered with 304 Not Modified when the client copy is current"""
+    response = jsonify(payload)
+    response.add_etag()
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+# ============================================================================
+# Cache Helpers
+# ============================================================================
+
+def ttl_cache(maxsize: int, timeout: float,
+              cache_if: Optional[Callable[[Any], bool]] = None) -> Callable:
+    """
+    In-process LRU cache whose entries expire after timeout seconds.
+
+    Unlike Flask-Caching, values are kept as live objects instead of being
+    pickled, so large indexes are not copied on every hit. Results for which
+    cache_if returns False are returned but not stored.
+    """
+    def decorator(func: Callable) -> Callable:
+        entries: OrderedDict = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args: Any) -> Any:
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(args)
+                if entry is not None and entry[0] > now:
+                    entries.move_to_end(args)
+                    return entry[1]
+
+            value = func(*args)
+            if cache_if is None or cache_if(value):
+                with lock:
+                    entries[args] = (now + timeout, value)
+                    entries.move_to_end(args)
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+            return value
+
+        def cache_clear() -> None:
+            with lock:
+                entries.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
 # ============================================================================
 # CKAN API Functions
 # ============================================================================
 
 def detect_coordinate_columns(headers: List[str]) -> Dict[str, Optional[str]]:
     """Detect latitude and longitude columns in CSV headers"""
-    headers_lower = [h.lower().strip() for h in headers]
-
-    lat_patterns = ['lat', 'latitude', 'breitengrad', 'y', 'northing']
-    lon_patterns = ['lon', 'lng', 'longitude', 'laengengrad', 'längengrad', 'x', 'easting']
-
-    lat_col = None
-    lon_col = None
-
-    for i, h in enumerate(headers_lower):
-        if not lat_col:
-            for pattern in lat_patterns:
-                if pattern == h or h.startswith(pattern):
-                    lat_col = headers[i]
-                    break
-
-        if not lon_col:
-            for pattern in lon_patterns:
-                if pattern == h or h.startswith(pattern):
-                    lon_col = headers[i]
-                    break
-
-    if not lat_col or not lon_col:
-        for i, h in enumerate(headers_lower):
-            if not lat_col:
-                for pattern in lat_patterns:
-                    if pattern in h:
-                        lat_col = headers[i]
-                        break
-
-            if not lon_col:
-                for pattern in lon_patterns:
-                    if pattern in h:
-                        lon_col = headers[i]
-                        break
-
-    return {'lat': lat_col, 'lon': lon_col}
+    def first_match(pattern: re.Pattern) -> Optional[str]:
+        # Prefer headers starting with a known name, then fall back to any containing one
+        for matches in (pattern.match, pattern.search):
+            for h in headers:
+                if matches(h.strip()):
+                    return h
+        return None
+
+    return {'lat': first_match(LAT_COLUMN_RE), 'lon': first_match(LON_COLUMN_RE)}
+
+def is_projected(x, y):
+    """Check whether coordinates (scalars or arrays) are outside the lon/lat range, i.e. projected"""
+    return (np.abs(x) > 180) | (np.abs(y) > 90)
+
+def utm_to_latlon(xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert arrays of UTM zone 32N easting/northing to latitude/longitude"""
+    lons, lats = UTM_TO_WGS84.transform(xs, ys)
+    return lats, lons
+
+def parse_coordinate_column(column: pd.Series) -> np.ndarray:
+    """Parse a CSV coordinate column (decimal point or comma) into floats, NaN where invalid"""
+    values = column.str.strip().str.replace(',', '.', regex=False)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
 
 def csv_to_geojson(csv_content: str, package_id: str) -> Dict[str, Any]:
     """Convert CSV content to GeoJSON format"""
+    if not csv_content.strip():
+        return {"type": "FeatureCollection", "features": []}
+
     try:
-        reader = csv.DictReader(io.StringIO(csv_content))
-        rows = list(reader)
+        # index_col=False keeps surplus fields from being turned into an index
+        df = pd.read_csv(
+            io.StringIO(csv_content), dtype=str, keep_default_na=False, on_bad_lines='skip',
+            index_col=False
+        )
 
-        if not rows:
+        if df.empty:
             return {"type": "FeatureCollection", "features": []}
 
-        headers = list(rows[0].keys())
-        coords = detect_coordinate_columns(headers)
+        coords = detect_coordinate_columns(list(df.columns))
 
-        if not coords['lat'] or not coords['lon']:
+        # One column matching both patterns (e.g. an unsplit 'name;lat;lon' header) is not a coordinate pair
+        if not coords['lat'] or not coords['lon'] or coords['lat'] == coords['lon']:
             return {"type": "FeatureCollection", "features": []}
 
-        features = []
-        for row in rows:
-            try:
-                lat_str = row.get(coords['lat'], '').strip()
-                lon_str = row.get(coords['lon'], '').strip()
-
-                if not lat_str or not lon_str:
-                    continue
-
-                lat = float(lat_str.replace(',', '.'))
-                lon = float(lon_str.replace(',', '.'))
-
-                properties = {k: v for k, v in row.items() if k not in [coords['lat'], coords['lon']]}
-
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    },
-                    "properties": properties
-                }
-
-                features.append(feature)
-            except (ValueError, AttributeError):
-                continue
+        lats = parse_coordinate_column(df[coords['lat']])
+        lons = parse_coordinate_column(df[coords['lon']])
+
+        # Also rejects 'inf' strings, which pd.to_numeric parses as infinite
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        lats, lons = lats[valid], lons[valid]
+
+        # Rows with projected (UTM) coordinates are converted in a single batch
+        projected = is_projected(lons, lats)
+        if projected.any():
+            lats[projected], lons[projected] = utm_to_latlon(lons[projected], lats[projected])
+
+        properties = df.loc[valid].drop(columns=list({coords['lat'], coords['lon']}))
+        # to_dict('records') yields nothing for a frame without columns
+        records = properties.to_dict('records') if len(properties.columns) else [{} for _ in range(len(lats))]
+
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [lon, lat]
+                },
+                "properties": props
+            }
+            for lon, lat, props in zip(lons.tolist(), lats.tolist(), records)
+        ]
 
         return {
             "type": "FeatureCollection",
@@ -104,83 +272,273 @@ def csv_to_geojson(csv_content: str, package_id: str) -> Dict[str, Any]:
         }
 
     except Exception as e:
-        print(f"Error converting CSV to GeoJSON: {e}")
+        app.logger.error("Error converting CSV to GeoJSON: %s", e)
         return {"type": "FeatureCollection", "features": []}
 
-@lru_cache(maxsize=100)
-def fetch_ckan_dataset(package_id: str) -> Dict[str, Any]:
-    """Fetch dataset from CKAN API and return GeoJSON data"""
+def dataset_cache_path(package_id: str) -> str:
+    """Return the disk cache file for a package"""
+    digest = hashlib.sha256(package_id.encode('utf-8')).hexdigest()
+    return os.path.join(CKAN_CACHE_DIR, f"{digest}.json")
+
+def read_cached_dataset(package_id: str) -> Optional[Dict[str, Any]]:
+    """Return the disk cache entry of a package (geojson, validators, expired), or None"""
+    path = dataset_cache_path(package_id)
     try:
-        package_url = f"{CKAN_API_BASE}/package_show"
-        params = {"id": package_id}
+        expired = time.time() - os.path.getmtime(path) > CKAN_CACHE_TTL
+        with open(path, 'rb') as f:
+            entry = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
 
-        response = requests.get(package_url, params=params, timeout=10)
-        response.raise_for_status()
+    if not isinstance(entry, dict) or 'geojson' not in entry:
+        return None
 
-        package_data = response.json()
+    entry['expired'] = expired
+    return entry
 
-        if not package_data.get('success'):
-            return {"type": "FeatureCollection", "features": []}
+def write_cached_dataset(package_id: str, geojson_data: Dict[str, Any],
+                         validators: Dict[str, Optional[str]]) -> None:
+    """Store the GeoJSON of a package and its HTTP validators in the disk cache"""
+    try:
+        os.makedirs(CKAN_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=CKAN_CACHE_DIR, suffix='.tmp', delete=False) as f:
+            f.write(orjson.dumps({'validators': validators, 'geojson': geojson_data}))
+        os.replace(f.name, dataset_cache_path(package_id))
+    except (OSError, TypeError) as e:
+        app.logger.warning("Error caching CKAN dataset %s: %s", package_id, e)
+
+def touch_cached_dataset(package_id: str) -> None:
+    """Mark the disk cache entry of a package as fresh again"""
+    try:
+        os.utime(dataset_cache_path(package_id))
+    except OSError as e:
+        app.logger.warning("Error refreshing cached CKAN dataset %s: %s", package_id, e)
 
-        resources = package_data.get('result', {}).get('resources', [])
-        data_resource = None
-        resource_format = None
+def download_ckan_dataset(package_id: str, validators: Optional[Dict[str, Optional[str]]] = None
+                          ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Optional[str]]]:
+    """
+    Download dataset from CKAN API and return GeoJSON data with its HTTP validators.
 
-        format_priority = ['geojson', 'json', 'csv']
+    When validators from an earlier download are given, the resource is requested
+    conditionally and (None, validators) is returned if it has not changed.
+    """
+    package_url = f"{CKAN_API_BASE}/package_show"
+    params = {"id": package_id}
 
-        for fmt in format_priority:
-            for resource in resources:
-                if resource.get('format', '').lower() == fmt:
-                    data_resource = resource
-                    resource_format = fmt
-                    break
-            if data_resource:
-                break
+    response = SESSION.get(package_url, params=params, timeout=10)
+    response.raise_for_status()
 
-        if not data_resource:
-            return {"type": "FeatureCollection", "features": []}
+    package_data = orjson.loads(response.content)
 
-        data_url = data_resource.get('url')
-        if not data_url:
-            return {"type": "FeatureCollection", "features": []}
+    if not package_data.get('success'):
+        raise RuntimeError(f"CKAN API error for package_show: {package_data}")
 
-        data_response = requests.get(data_url, timeout=30)
-        data_response.raise_for_status()
+    resources = package_data.get('result', {}).get('resources', [])
+    data_resource = None
+    resource_format = None
 
-        if resource_format == 'csv':
-            csv_content = data_response.text
-            geojson_data = csv_to_geojson(csv_content, package_id)
-        else:
-            geojson_data = data_response.json()
+    format_priority = ['geojson', 'json', 'csv']
+
+    for fmt in format_priority:
+        for resource in resources:
+            if resource.get('format', '').lower() == fmt:
+                data_resource = resource
+                resource_format = fmt
+                break
+        if data_resource:
+            break
+
+    if not data_resource:
+        return {"type": "FeatureCollection", "features": []}, {}
+
+    data_url = data_resource.get('url')
+    if not data_url:
+        return {"type": "FeatureCollection", "features": []}, {}
+
+    headers = {}
+    if validators and validators.get('url') == data_url:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    data_response = SESSION.get(data_url, headers=headers, timeout=30, stream=True)
+    if data_response.status_code == 304:
+        data_response.close()
+        return None, validators
+
+    data_response.raise_for_status()
+    validators = {
+        'url': data_url,
+        'etag': data_response.headers.get('ETag'),
+        'last_modified': data_response.headers.get('Last-Modified')
+    }
+
+    content_length = int(data_response.headers.get('Content-Length') or 0)
+
+    if resource_format == 'csv':
+        csv_content = data_response.text
+        geojson_data = csv_to_geojson(csv_content, package_id)
+    elif content_length >= STREAM_PARSE_MIN_BYTES:
+        # Parse large files feature by feature so the raw body is never held in memory
+        data_response.raw.decode_content = True
+        features = list(ijson.items(data_response.raw, 'features.item', use_float=True))
+        geojson_data = {"type": "FeatureCollection", "features": features}
+    else:
+        geojson_data = orjson.loads(data_response.content)
+
+    return geojson_data, validators
+
+def load_ckan_dataset(package_id: str) -> Dict[str, Any]:
+    """Load dataset from the disk cache or the CKAN API and return GeoJSON data"""
+    entry = read_cached_dataset(package_id)
+    if entry is not None and not entry['expired']:
+        return entry['geojson']
+
+    try:
+        geojson_data, validators = download_ckan_dataset(
+            package_id, entry['validators'] if entry is not None else None
+        )
+    except Exception as e:
+        # Prefer a stale copy over no data when CKAN is unreachable; without one the
+        # error propagates, so the failure is not memoized as an empty dataset
+        if entry is None:
+            raise
+        app.logger.warning("Error fetching CKAN dataset %s, serving cached copy: %s", package_id, e)
+        return entry['geojson']
+
+    if geojson_data is None:
+        # Resource unchanged since it was cached
+        touch_cached_dataset(package_id)
+        return entry['geojson']
+
+    write_cached_dataset(package_id, geojson_data, validators)
+    return geojson_data
+
+@cache.memoize()
+def fetch_ckan_dataset(package_id: str) -> Dict[str, Any]:
+    """Fetch GeoJSON data of a dataset with each feature tagged with its dataset_id"""
+    geojson_data = load_ckan_dataset(package_id)
+    # Tagged once when the cache is filled rather than on every request
+    for feature in geojson_data.get('features', []):
+        feature['dataset_id'] = package_id
+    return geojson_data
+
+def fetch_dataset_metadata(dataset_ids: Tuple[str, ...]) -> Dict[str, Dict[str, str]]:
+    """Fetch titles and names of datasets (by id or name) via batched package_search; raises on CKAN errors"""
+    # Recently seen datasets are served from the shared cache; only the rest are looked up
+    cache_keys = {dataset_id: f"dataset_metadata:{dataset_id}" for dataset_id in dict.fromkeys(dataset_ids)}
+    cached = zip(cache_keys, cache.get_many(*cache_keys.values()))
+    metadata = {dataset_id: entry for dataset_id, entry in cached if entry is not None}
+    missing = [dataset_id for dataset_id in cache_keys if dataset_id not in metadata]
+
+    fetched = {}
+    try:
+        for start in range(0, len(missing), METADATA_BATCH_SIZE):
+            wanted = dict.fromkeys(missing[start:start + METADATA_BATCH_SIZE])
+            terms = ' OR '.join('"' + dataset_id.replace('\\', '\\\\').replace('"', '\\"') + '"'
+                                for dataset_id in wanted)
+            params = {
+                'fq': f'id:({terms}) OR name:({terms})',
+                'rows': len(wanted),
+                'fl': 'id,name,title'
+            }
+            response = SESSION.get(f"{CKAN_API_BASE}/package_search", params=params, timeout=10)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            if not data.get('success'):
+                raise RuntimeError(f"CKAN package_search failed: {data.get('error')}")
+
+            for package in data['result'].get('results', []):
+                # Selections may reference a dataset by id or by name
+                for key in (package.get('id'), package.get('name')):
+                    if key in wanted:
+                        fetched[key] = {
+                            'title': package.get('title', key),
+                            'name': package.get('name', '')
+                        }
+    finally:
+        # Batches that did succeed are reused even if a later one failed
+        if fetched:
+            cache.set_many(
+                {cache_keys[dataset_id]: entry for dataset_id, entry in fetched.items()},
+                timeout=METADATA_CACHE_TIMEOUT
+            )
+
+    metadata.update(fetched)
+    return metadata
+
+def load_dataset(dataset_id: str, max_per_dataset: int) -> Optional[List[Dict]]:
+    """Fetch sampled features of a single dataset, or None if it could not be loaded"""
+    try:
+        geojson_data = fetch_ckan_dataset(dataset_id)
+        features = geojson_data.get('features', [])
 
-        return geojson_data
+        if len(features) > max_per_dataset:
+            # Evenly spaced sample, indices computed in one NumPy step
+            step = len(features) / max_per_dataset
+            sample = (np.arange(max(max_per_dataset, 0)) * step).astype(np.intp)
+            features = list(map(features.__getitem__, sample.tolist()))
 
+        return features
     except Exception as e:
-        print(f"Error fetching CKAN dataset {package_id}: {e}")
-        return {"type": "FeatureCollection", "features": []}
+        app.logger.error("Error loading dataset %s: %s", dataset_id, e)
+        return None
+
+@ttl_cache(maxsize=32, timeout=AGGREGATE_CACHE_TIMEOUT, cache_if=lambda aggregate: aggregate['complete'])
+def aggregate_datasets(dataset_ids: Tuple[str, ...], max_per_dataset: int) -> Dict[str, Any]:
+    """
+    Fetch, sample and flatten the features of a dataset selection.
+
+    Selections are cached for AGGREGATE_CACHE_TIMEOUT seconds, unless a dataset
+    or the metadata lookup failed; those are rebuilt on the next request.
+    """
+    all_features = []
+    complete = True
+
+    # Datasets are fetched concurrently, alongside one batched metadata lookup;
+    # map() keeps the results in request order
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(dataset_ids)) + 1) as executor:
+        metadata_future = executor.submit(fetch_dataset_metadata, dataset_ids)
+        for features in executor.map(lambda dataset_id: load_dataset(dataset_id, max_per_dataset), dataset_ids):
+            if features is None:
+                complete = False
+                continue
+            all_features.extend(features)
+        try:
+            metadata = metadata_future.result()
+        except Exception as e:
+            # Serve the features without titles, but do not cache the selection
+            app.logger.error("Error fetching dataset metadata: %s", e)
+            metadata = {}
+            complete = False
+
+    dataset_metadata = {
+        dataset_id: metadata[dataset_id] for dataset_id in dataset_ids if dataset_id in metadata
+    }
+    return {
+        'complete': complete,
+        'dataset_metadata': dataset_metadata,
+        'features': all_features,
+        'search_blobs': [build_search_blob(feature) for feature in all_features],
+        'empty_responses': {},
+        **build_point_index(all_features)
+    }
 
 # ============================================================================
 # Helper Functions
 # ============================================================================
 
-def search_features(features: List[Dict], query: str) -> List[Dict]:
-    """Search through features based on query string"""
-    if not query or query.strip() == '':
-        return features
+def build_search_blob(feature: Dict) -> str:
+    """Build the lowercased text that search queries are matched against"""
+    properties = feature.get('properties') or {}
+    return ' '.join(str(v) for v in properties.values() if v is not None).lower()
 
+def search_feature_positions(search_blobs: List[str], query: str) -> List[int]:
+    """Return the sorted positions of the search blobs containing a non-empty query"""
     query_lower = query.lower().strip()
-    results = []
-
-    for feature in features:
-        properties = feature.get('properties', {})
-        searchable_text = ' '.join(
-            str(v).lower() for v in properties.values() if v is not None
-        )
-
-        if query_lower in searchable_text:
-            results.append(feature)
-
-    return results
+    return [i for i, blob in enumerate(search_blobs) if query_lower in blob]
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points in km using Haversine formula"""
@@ -197,10 +555,214 @@ def calculate_distance(lat1, lon1, lat2, lon2):
 
     return R * c
 
+def haversine_vector(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Calculate distances in km from one point to arrays of points using Haversine formula"""
+    lat0, lon0 = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    dlat = lats - lat0
+    dlon = lons - lon0
+
+    a = np.sin(dlat/2)**2 + np.cos(lat0) * np.cos(lats) * np.sin(dlon/2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def unit_sphere_xyz(lats, lons) -> np.ndarray:
+    """Project latitude/longitude in degrees onto 3D unit-sphere Cartesian coordinates"""
+    lats, lons = np.radians(lats), np.radians(lons)
+    cos_lats = np.cos(lats)
+    return np.stack([cos_lats * np.cos(lons), cos_lats * np.sin(lons), np.sin(lats)], axis=-1)
+
+def build_point_index(features: List[Dict]) -> Dict[str, Any]:
+    """Collect Point coordinates into arrays and a KD-tree for nearest-neighbour queries"""
+    positions = []
+    lats = []
+    lons = []
+    for i, feature in enumerate(features):
+        if feature.get('geometry') and feature['geometry'].get('type') == 'Point':
+            try:
+                coords = feature['geometry']['coordinates']
+                feature_lon, feature_lat = float(coords[0]), float(coords[1])
+            except (TypeError, ValueError, IndexError):
+                continue
+            positions.append(i)
+            lats.append(feature_lat)
+            lons.append(feature_lon)
+
+    point_lats = np.asarray(lats, dtype=np.float64)
+    point_lons = np.asarray(lons, dtype=np.float64)
+
+    # NaN/infinite coordinates would poison the KD-tree and the UTM transform
+    finite = np.isfinite(point_lats) & np.isfinite(point_lons)
+    if not finite.all():
+        positions = np.asarray(positions, dtype=np.intp)[finite]
+        point_lats, point_lons = point_lats[finite], point_lons[finite]
+
+    # Points published in UTM are converted in one batch so distances are meaningful
+    projected = is_projected(point_lons, point_lats)
+    if projected.any():
+        point_lats[projected], point_lons[projected] = utm_to_latlon(
+            point_lons[projected], point_lats[projected]
+        )
+
+    return {
+        'point_positions': np.asarray(positions, dtype=np.intp),
+        'point_lats': point_lats,
+        'point_lons': point_lons,
+        'point_tree': cKDTree(unit_sphere_xyz(point_lats, point_lons)) if len(positions) else None
+    }
+
+def km_to_chord(distance_km: float) -> float:
+    """Convert a great-circle distance in km to a chord length on the unit sphere"""
+    return 2 * np.sin(min(distance_km / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+def nearest_point_indices(aggregate: Dict[str, Any], lat: float, lon: float, k: int,
+                          eligible: np.ndarray) -> np.ndarray:
+    """Return indices of eligible points that can be among the k nearest, ties included"""
+    n_points = len(eligible)
+    n_eligible = int(np.count_nonzero(eligible))
+
+    # Tree neighbours expected to contain k eligible points; when that is most of
+    # the points anyway, checking every eligible point is cheaper than the tree
+    k_query = min(n_points, -(-k * n_points // n_eligible))
+    if k_query * 2 > n_points:
+        return np.flatnonzero(eligible)
+
+    tree = aggregate['point_tree']
+    query_xyz = unit_sphere_xyz(lat, lon)
+    while True:
+        chords, idx = tree.query(query_xyz, k=k_query)
+        chords, idx = np.atleast_1d(chords), np.atleast_1d(idx)
+        keep = eligible[idx]
+        if np.count_nonzero(keep) >= k or k_query == n_points:
+            break
+        k_query = min(n_points, k_query * 2)
+
+    # Widen the k nearest to every point that may round to the same distance as
+    # the k-th one, so ties are broken by original position like the full sort
+    cutoff_km = 2 * EARTH_RADIUS_KM * np.arcsin(chords[keep][k - 1] / 2) + 0.01
+    idx = np.asarray(tree.query_ball_point(query_xyz, km_to_chord(cutoff_km)), dtype=np.intp)
+    return idx[eligible[idx]]
+
+def features_by_distance(aggregate: Dict[str, Any], idx: np.ndarray, distances: np.ndarray,
+                         k: int) -> List[Dict]:
+    """Return copies of the k nearest point features among idx, with distance_km attached"""
+    if k <= 0:
+        return []
+
+    features = aggregate['features']
+    positions = aggregate['point_positions']
+
+    if len(idx) > k:
+        # Only points up to the k-th smallest distance (ties included) need sorting
+        within = distances <= np.partition(distances, k - 1)[k - 1]
+        idx, distances = idx[within], distances[within]
+    # Same order as a full stable sort: rounded distance first, then original position
+    order = np.lexsort((idx, distances))[:k]
+
+    # Features are shared with the aggregate cache, so attach distances to copies
+    return [
+        {**features[positions[i]], 'distance_km': d}
+        for i, d in zip(idx[order].tolist(), distances[order].tolist())
+    ]
+
+def nearest_features(aggregate: Dict[str, Any], lat: float, lon: float, limit: int,
+                     matched: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Return the first limit features of the aggregate ordered by distance to a point.
+
+    If matched positions are given, only those features are considered. Features
+    without a usable point keep their order after all points.
+    """
+    features = aggregate['features']
+    positions = aggregate['point_positions']
+
+    if matched is None:
+        eligible = np.ones(len(positions), dtype=bool)
+    else:
+        eligible = np.isin(positions, np.asarray(matched, dtype=np.intp))
+    k = min(limit, int(np.count_nonzero(eligible)))
+
+    nearest = []
+    if k > 0:
+        idx = nearest_point_indices(aggregate, lat, lon, k, eligible)
+        distances = np.round(haversine_vector(
+            lat, lon, aggregate['point_lats'][idx], aggregate['point_lons'][idx]
+        ), 2)
+        nearest = features_by_distance(aggregate, idx, distances, k)
+
+    if len(nearest) < limit:
+        with_point = set(positions.tolist())
+        candidates = range(len(features)) if matched is None else matched
+        without_point = (features[i] for i in candidates if i not in with_point)
+        nearest.extend(islice(without_point, limit - len(nearest)))
+
+    return nearest
+
+def features_within_radius(aggregate: Dict[str, Any], lat: float, lon: float, radius_km: float,
+                           limit: int, matched: Optional[List[int]] = None) -> Tuple[List[Dict], int]:
+    """
+    Return the first limit point features within radius_km of a point ordered by
+    distance, and how many features lie within the radius.
+
+    If matched positions are given, only those features are considered.
+    """
+    tree = aggregate['point_tree']
+    if tree is None or radius_km < 0:
+        return [], 0
+
+    # Distances are compared after rounding to 10 m, so also collect points just
+    # beyond the radius that round down onto it
+    idx = np.asarray(
+        tree.query_ball_point(unit_sphere_xyz(lat, lon), km_to_chord(radius_km + 0.01)),
+        dtype=np.intp
+    )
+    if matched is not None:
+        idx = idx[np.isin(aggregate['point_positions'][idx], np.asarray(matched, dtype=np.intp))]
+
+    distances = np.round(haversine_vector(
+        lat, lon, aggregate['point_lats'][idx], aggregate['point_lons'][idx]
+    ), 2)
+    within = distances <= radius_km
+    idx, distances = idx[within], distances[within]
+
+    return features_by_distance(aggregate, idx, distances, min(limit, len(idx))), len(idx)
+
 # ============================================================================
 # Search Endpoint
 # ============================================================================
 
+def stream_search_response(query: str, total: int, results: List[Dict],
+                           dataset_metadata: Dict[str, Any]) -> Iterator[bytes]:
+    """Serialize a /api/search response in chunks of features instead of one large body"""
+    yield (
+        b'{"query":' + orjson.dumps(query)
+        + b',"total":' + orjson.dumps(total)
+        + b',"count":' + orjson.dumps(len(results))
+        + b',"results":['
+    )
+    for start in range(0, len(results), STREAM_BATCH_SIZE):
+        batch = results[start:start + STREAM_BATCH_SIZE]
+        chunk = b','.join(orjson.dumps(feature, option=ORJSON_OPTIONS) for feature in batch)
+        yield chunk if start == 0 else b',' + chunk
+    yield b'],"dataset_metadata":' + orjson.dumps(dataset_metadata) + b'}'
+
+def empty_search_response(aggregate: Dict[str, Any], limit: int) -> bytes:
+    """Serialized /api/search response for an empty query, kept with the cached aggregate"""
+    # Stored on the aggregate so the body expires together with the data it serializes
+    responses = aggregate['empty_responses']
+    body = responses.get(limit)
+    if body is None:
+        results = aggregate['features'][:limit]
+        body = orjson.dumps({
+            'query': '',
+            'total': len(aggregate['features']),
+            'count': len(results),
+            'results': results,
+            'dataset_metadata': aggregate['dataset_metadata']
+        }, option=ORJSON_OPTIONS)
+        if len(responses) < EMPTY_RESPONSES_PER_SELECTION:
+            responses[limit] = body
+    return body
+
 @app.route('/api/search', methods=['GET'])
 def global_search():
     """Search across datasets"""
@@ -209,8 +771,9 @@ def global_search():
         dataset_ids = request.args.getlist('datasets')
         lat = request.args.get('lat', type=float)
         lon = request.args.get('lon', type=float)
-        limit = min(request.args.get('limit', 500, type=int), 2000)
+        limit = max(0, min(request.args.get('limit', 500, type=int), 2000))
         max_per_dataset = min(request.args.get('max_per_dataset', 200, type=int), 500)
+        radius_km = request.args.get('radius_km', type=float)
 
         if not dataset_ids:
             return jsonify({
@@ -219,62 +782,45 @@ def global_search():
                 'total': 0
             })
 
-        dataset_metadata = {}
-        all_features = []
-
-        for dataset_id in dataset_ids:
-            try:
-                # Fetch metadata
-                pkg_url = f"{CKAN_API_BASE}/package_show"
-                pkg_response = requests.get(pkg_url, params={'id': dataset_id}, timeout=5)
-                if pkg_response.status_code == 200:
-                    pkg_data = pkg_response.json()
-                    if pkg_data.get('success'):
-                        dataset_metadata[dataset_id] = {
-                            'title': pkg_data['result'].get('title', dataset_id),
-                            'name': pkg_data['result'].get('name', '')
-                        }
-
-                # Fetch data
-                geojson_data = fetch_ckan_dataset(dataset_id)
-                features = geojson_data.get('features', [])
-
-                if len(features) > max_per_dataset:
-                    step = len(features) / max_per_dataset
-                    features = [features[int(i * step)] for i in range(max_per_dataset)]
+        has_location = lat is not None and lon is not None
+        if has_location and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({'error': 'lat must be within [-90, 90] and lon within [-180, 180]'}), 400
 
-                for feature in features:
-                    feature['dataset_id'] = dataset_id
+        aggregate = aggregate_datasets(tuple(dataset_ids), max_per_dataset)
 
-                all_features.extend(features)
-            except Exception as e:
-                print(f"Error loading dataset {dataset_id}: {e}")
+        if not query and not has_location:
+            # Unfiltered listings are served from a pre-serialized response
+            body = empty_search_response(aggregate, limit)
+            return Response(body, mimetype='application/json')
 
-        results = search_features(all_features, query)
+        dataset_metadata = aggregate['dataset_metadata']
 
-        if lat and lon:
-            for feature in results:
-                if feature.get('geometry') and feature['geometry'].get('type') == 'Point':
-                    coords = feature['geometry']['coordinates']
-                    feature_lon, feature_lat = coords[0], coords[1]
-                    if feature_lat and feature_lon:
-                        distance = calculate_distance(lat, lon, feature_lat, feature_lon)
-                        feature['distance_km'] = round(distance, 2)
-            results = sorted(results, key=lambda x: x.get('distance_km', float('inf')))
+        features = aggregate['features']
+        if query.strip() == '':
+            matched = None
+            results = features
+        else:
+            matched = search_feature_positions(aggregate['search_blobs'], query)
+            results = [features[i] for i in matched]
 
         total_results = len(results)
-        results = results[:limit]
 
-        return jsonify({
-            'query': query,
-            'total': total_results,
-            'count': len(results),
-            'results': results,
-            'dataset_metadata': dataset_metadata
-        })
+        if has_location and radius_km is not None:
+            results, total_results = features_within_radius(
+                aggregate, lat, lon, radius_km, limit, matched
+            )
+        elif has_location:
+            results = nearest_features(aggregate, lat, lon, limit, matched)
+        else:
+            results = results[:limit]
+
+        return Response(
+            stream_search_response(query, total_results, results, dataset_metadata),
+            mimetype='application/json'
+        )
 
     except Exception as e:
-        print(f"Error in global search: {e}")
+        app.logger.error("Error in global search: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # ============================================================================
@@ -295,10 +841,10 @@ def list_datasets():
             'fl': 'id,name,title,notes,num_resources'
         }
 
-        response = requests.get(search_url, params=params, timeout=10)
+        response = SESSION.get(search_url, params=params, timeout=10)
         response.raise_for_status()
 
-        data = response.json()
+        data = orjson.loads(response.content)
 
         if not data.get('success'):
             return jsonify({'error': 'CKAN API error'}), 500
@@ -316,13 +862,13 @@ def list_datasets():
                 'num_resources': dataset.get('num_resources', 0)
             })
 
-        return jsonify({
+        return conditional_json({
             'count': result.get('count', 0),
             'datasets': formatted_datasets
         })
 
     except Exception as e:
-        print(f"Error fetching datasets: {e}")
+        app.logger.error("Error fetching datasets: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/datasets/search', methods=['GET'])
@@ -341,10 +887,10 @@ def search_datasets():
             'fl': 'id,name,title'
         }
 
-        response = requests.get(search_url, params=params, timeout=10)
+        response = SESSION.get(search_url, params=params, timeout=10)
         response.raise_for_status()
 
-        data = response.json()
+        data = orjson.loads(response.content)
 
         if not data.get('success'):
             return jsonify({'suggestions': []})
@@ -359,10 +905,10 @@ def search_datasets():
                 'title': dataset.get('title')
             })
 
-        return jsonify({'suggestions': suggestions})
+        return conditional_json({'suggestions': suggestions})
 
     except Exception as e:
-        print(f"Error in dataset search: {e}")
+        app.logger.error("Error in dataset search: %s", e)
         return jsonify({'suggestions': []})
 
 # ============================================================================
@@ -376,19 +922,19 @@ def stats():
         search_url = f"{CKAN_API_BASE}/package_search"
         params = {'rows': 0}
 
-        response = requests.get(search_url, params=params, timeout=10)
+        response = SESSION.get(search_url, params=params, timeout=10)
         response.raise_for_status()
 
-        data = response.json()
+        data = orjson.loads(response.content)
         total_datasets = data.get('result', {}).get('count', 0)
 
-        return jsonify({
+        return conditional_json({
             'total_datasets': total_datasets,
             'api_base': CKAN_API_BASE
         })
 
     except Exception as e:
-        print(f"Error getting stats: {e}")
+        app.logger.error("Error getting stats: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
@@ -403,7 +949,7 @@ def index():
         'message': 'Munich Open Data API',
         'version': '5.0.0',
         'endpoints': {
-            'GET /api/search': 'Search across datasets (params: q, datasets[], lat, lon, limit)',
+            'GET /api/search': 'Search across datasets (params: q, datasets[], lat, lon, radius_km, limit)',
             'GET /api/datasets': 'List all datasets (params: q, limit)',
             'GET /api/datasets/search': 'Dataset autocomplete (params: q)',
             'GET /api/stats': 'Get statistics',
@@ -413,4 +959,7 @@ def index():
     })
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # Development server only; serve with gunicorn for concurrent requests:
+    #   gunicorn -w 5 -k gthread --threads 8 -b 0.0.0.0:5001 app:app
+    # Reloader and interactive tracebacks only on request, e.g. FLASK_DEBUG=1
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5001)
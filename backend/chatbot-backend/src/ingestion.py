@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import math
-import time
 from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, Optional
 
@@ -13,6 +12,11 @@ from .vector_store import get_chroma_client, upsert_datasets
 
 CKAN_BASE_URL = "https://opendata.muenchen.de/api/3/action"
 USABLE_FORMATS = {"CSV", "WFS", "GEOJSON", "JSON"}
+# CKAN caps package_search at 1000 rows per page
+SEARCH_PAGE_SIZE = 1000
+
+# Shared session so the paged package_search calls reuse one keep-alive connection
+_SESSION = requests.Session()
 
 # Ensure environment variables from `.env` are loaded when running ingestion
 load_dotenv()
@@ -36,7 +40,7 @@ class DatasetMetadata:
 
 def _ckan_get(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     url = f"{CKAN_BASE_URL}/{endpoint}"
-    resp = requests.get(url, params=params, timeout=30)
+    resp = _SESSION.get(url, params=params, timeout=30)
     resp.raise_for_status()
     data = resp.json()
     if not data.get("success"):
@@ -44,10 +48,26 @@ def _ckan_get(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[st
     return data["result"]
 
 
-def fetch_all_package_ids() -> List[str]:
-    """Fetch list of all CKAN package IDs using /package_list."""
-    result = _ckan_get("package_list")
-    return list(result)
+def iter_packages(
+    max_packages: Optional[int] = None, page_size: int = SEARCH_PAGE_SIZE
+) -> Iterable[Dict[str, Any]]:
+    """
+    Yield full CKAN package dicts (including resources) via paged /package_search.
+
+    One request returns up to `page_size` packages, instead of one
+    package_show round trip per package ID.
+    """
+    start = 0
+    while max_packages is None or start < max_packages:
+        rows = page_size if max_packages is None else min(page_size, max_packages - start)
+        result = _ckan_get(
+            "package_search", params={"q": "*:*", "rows": rows, "start": start, "sort": "id asc"}
+        )
+        packages = result.get("results", []) or []
+        yield from packages
+        start += len(packages)
+        if not packages or start >= result.get("count", 0):
+            break
 
 
 def batched(iterable: Iterable[Any], batch_size: int) -> Iterable[List[Any]]:
@@ -62,16 +82,15 @@ def batched(iterable: Iterable[Any], batch_size: int) -> Iterable[List[Any]]:
         yield batch
 
 
-def fetch_package_metadata(package_id: str) -> Optional[DatasetMetadata]:
+def package_to_metadata(result: Dict[str, Any]) -> Optional[DatasetMetadata]:
     """
-    Fetch and normalize metadata for a single CKAN package.
+    Normalize a CKAN package dict from package_search.
 
-    Returns None if the package has no usable resources.
+    The package name is used as ID, as in collections ingested before
+    package_search was used. Returns None if the package has no usable resources.
     """
-    try:
-        result = _ckan_get("package_show", params={"id": package_id})
-    except Exception:
-        # Skip problematic packages, but keep ingestion running
+    package_id = result.get("name") or result.get("id")
+    if not package_id:
         return None
 
     title = (result.get("title") or "").strip()
@@ -117,31 +136,26 @@ def fetch_package_metadata(package_id: str) -> Optional[DatasetMetadata]:
 
 def ingest_catalog(
     batch_size: int = 20,
-    sleep_between_batches: float = 0.2,
     max_packages: Optional[int] = None,
 ) -> None:
     """
     Ingest the Munich Open Data catalog metadata into ChromaDB.
 
-    - Fetches all package IDs
-    - For each ID, calls package_show
+    - Pages through all packages with package_search (resources included)
     - Filters for usable formats (CSV, WFS, GeoJSON, JSON)
     - Builds a summary string
     - Upserts into the `munich_data_catalog` Chroma collection
     """
     client = get_chroma_client()
-    package_ids = fetch_all_package_ids()
-
-    if max_packages is not None:
-        package_ids = package_ids[:max_packages]
+    packages = list(iter_packages(max_packages=max_packages))
 
-    total = len(package_ids)
-    print(f"Found {total} package IDs.")
+    total = len(packages)
+    print(f"Found {total} packages.")
 
-    for idx_batch, id_batch in enumerate(batched(package_ids, batch_size), start=1):
+    for idx_batch, package_batch in enumerate(batched(packages, batch_size), start=1):
         metadatas: List[DatasetMetadata] = []
-        for pkg_id in id_batch:
-            meta = fetch_package_metadata(pkg_id)
+        for package in package_batch:
+            meta = package_to_metadata(package)
             if meta is not None:
                 metadatas.append(meta)
 
@@ -171,8 +185,6 @@ def ingest_catalog(
         pct = (done / total) * 100 if total else 100
         print(f"Ingested batch {idx_batch}, total {done}/{total} ({pct:.1f}%).")
 
-        time.sleep(sleep_between_batches)
-
 
 if __name__ == "__main__":
     ingest_catalog()
@@ -0,0 +1,11 @@
+# Gunicorn settings for the backend, picked up automatically when gunicorn is
+# started from this directory. app.py reads threads from here to size its
+# CKAN connection pool, so change the thread count here or via REQUEST_THREADS
+import os
+
+bind = '0.0.0.0:5001'
+workers = 5
+
+# Threaded workers so requests waiting on CKAN do not block each other
+worker_class = 'gthread'
+threads = int(os.environ.get('REQUEST_THREADS', 8))
@@ -0,0 +1,59 @@
+"""
+Checks for the CSV to GeoJSON conversion in app.py.
+
+Run from the backend directory with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def points(geojson):
+    return [feature['geometry']['coordinates'] for feature in geojson['features']]
+
+
+class CsvToGeojsonTest(unittest.TestCase):
+
+    def test_semicolon_delimited_csv_yields_no_features(self):
+        # The header is read as the single column 'name;lat;lon', which matches
+        # both coordinate patterns and must not be used as lat and lon
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            geojson = app.csv_to_geojson("name;lat;lon\nA;48,1;11,5\n", 'p')
+        self.assertEqual(geojson['features'], [])
+
+    def test_comma_decimal_coordinates(self):
+        geojson = app.csv_to_geojson('name,lat,lon\nA,"48,1","11,5"\nB,48.2,11.6\n', 'p')
+        self.assertEqual(points(geojson), [[11.5, 48.1], [11.6, 48.2]])
+        self.assertEqual(geojson['features'][0]['properties'], {'name': 'A'})
+
+    def test_rows_with_missing_or_invalid_coordinates_are_skipped(self):
+        geojson = app.csv_to_geojson('name,lat,lon\nA,,\nB,48.2,\nC,abc,11.6\nD,inf,11.6\nE,48.3,11.7\n', 'p')
+        self.assertEqual(points(geojson), [[11.7, 48.3]])
+        self.assertEqual(geojson['features'][0]['properties'], {'name': 'E'})
+
+    def test_csv_without_coordinate_columns(self):
+        self.assertEqual(app.csv_to_geojson('name,street\nA,Marienplatz\n', 'p')['features'], [])
+        self.assertEqual(app.csv_to_geojson('', 'p')['features'], [])
+
+    def test_utm_xy_columns_are_converted(self):
+        geojson = app.csv_to_geojson('name,x,y\nA,691000,5334000\nB,11.5,48.1\n', 'p')
+        (utm_lon, utm_lat), plain = points(geojson)
+        self.assertAlmostEqual(utm_lat, 48.1306, places=3)
+        self.assertAlmostEqual(utm_lon, 11.5671, places=3)
+        self.assertEqual(plain, [11.5, 48.1])
+
+    def test_coordinate_only_csv_keeps_empty_properties(self):
+        geojson = app.csv_to_geojson('lat,lon\n48.1,11.5\n', 'p')
+        self.assertEqual(points(geojson), [[11.5, 48.1]])
+        self.assertEqual(geojson['features'][0]['properties'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Equivalence checks for the KD-tree based proximity ordering in app.py.
+
+The indexed path (nearest_point_indices / nearest_features /
+features_within_radius) must return exactly what the original full scan
+returned: a stable sort of all candidates by distance rounded to 10 m, with
+features without a point kept in order after all points.
+
+Run from the backend directory with: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def make_features(rng, n):
+    """Random features around Munich with duplicated and grid-snapped points to force ties"""
+    features = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.1:
+            geometry = {'type': 'Polygon', 'coordinates': [[[11.5, 48.1], [11.6, 48.1], [11.5, 48.2], [11.5, 48.1]]]}
+        elif roll < 0.2 and features:
+            # Exact duplicate of an earlier point
+            geometry = dict(rng.choice(features)['geometry'])
+        else:
+            geometry = {
+                'type': 'Point',
+                'coordinates': [round(11.5 + rng.uniform(-0.3, 0.3), 3), round(48.1 + rng.uniform(-0.3, 0.3), 3)]
+            }
+        features.append({'type': 'Feature', 'geometry': geometry, 'properties': {'position': i}})
+    return features
+
+
+def make_aggregate(features):
+    return {'features': features, **app.build_point_index(features)}
+
+
+def reference_nearest(features, lat, lon, limit, matched=None):
+    """The original algorithm: distance for every point, then a full stable sort"""
+    candidates = [features[i] for i in (range(len(features)) if matched is None else matched)]
+    results = []
+    for feature in candidates:
+        feature = dict(feature)
+        if feature['geometry']['type'] == 'Point':
+            feature_lon, feature_lat = feature['geometry']['coordinates']
+            feature['distance_km'] = round(app.calculate_distance(lat, lon, feature_lat, feature_lon), 2)
+        results.append(feature)
+    results.sort(key=lambda f: f.get('distance_km', float('inf')))
+    return results[:limit]
+
+
+def reference_within_radius(features, lat, lon, radius_km, limit, matched=None):
+    """Full scan of the points within the radius, stable-sorted by rounded distance"""
+    within = [f for f in reference_nearest(features, lat, lon, len(features), matched)
+              if f.get('distance_km', float('inf')) <= radius_km]
+    return within[:limit], len(within)
+
+
+def summary(results):
+    return [(f['properties']['position'], f.get('distance_km')) for f in results]
+
+
+class ProximityOrderingTest(unittest.TestCase):
+
+    def random_cases(self, seed, count=200):
+        rng = random.Random(seed)
+        for _ in range(count):
+            features = make_features(rng, rng.randint(0, 300))
+            lat = 48.1 + rng.uniform(-0.4, 0.4)
+            lon = 11.5 + rng.uniform(-0.4, 0.4)
+            limit = rng.choice([1, 2, 5, 20, 100, 500])
+            if rng.random() < 0.5:
+                matched = None
+            else:
+                matched = sorted(rng.sample(range(len(features)), rng.randint(0, len(features))))
+            yield rng, features, lat, lon, limit, matched
+
+    def test_nearest_features_matches_full_sort(self):
+        for seed in range(5):
+            for _, features, lat, lon, limit, matched in self.random_cases(seed):
+                aggregate = make_aggregate(features)
+                expected = reference_nearest(features, lat, lon, limit, matched)
+                actual = app.nearest_features(aggregate, lat, lon, limit, matched)
+                self.assertEqual(summary(actual), summary(expected))
+
+    def test_features_within_radius_matches_full_scan(self):
+        for seed in range(5):
+            for rng, features, lat, lon, limit, matched in self.random_cases(seed):
+                radius_km = rng.choice([0, 0.5, 1, 3, 10, 100])
+                aggregate = make_aggregate(features)
+                expected, expected_total = reference_within_radius(
+                    features, lat, lon, radius_km, limit, matched
+                )
+                actual, total = app.features_within_radius(aggregate, lat, lon, radius_km, limit, matched)
+                self.assertEqual(summary(actual), summary(expected))
+                self.assertEqual(total, expected_total)
+
+    def test_zero_and_negative_limits_return_nothing(self):
+        features = make_features(random.Random(0), 100)
+        aggregate = make_aggregate(features)
+        for limit in (0, -1, -5):
+            self.assertEqual(app.nearest_features(aggregate, 48.1, 11.5, limit), [])
+            # One candidate in range and many candidates in range
+            for radius_km in (0.001, 100):
+                self.assertEqual(app.features_within_radius(aggregate, 48.1, 11.5, radius_km, limit)[0], [])
+
+    def test_cached_features_are_not_modified(self):
+        features = make_features(random.Random(0), 50)
+        app.nearest_features(make_aggregate(features), 48.1, 11.5, 10)
+        self.assertFalse(any('distance_km' in f for f in features))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,7 +24,8 @@ else
     echo "Starting backend server..."
     cd backend
     source venv/bin/activate
-    python3 app.py &
+    # Threaded gunicorn workers, configured in backend/gunicorn.conf.py
+    gunicorn app:app &
     BACKEND_PID=$!
     cd ..
 